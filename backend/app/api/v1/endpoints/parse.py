@@ -1,50 +1,188 @@
+import asyncio
 import logging
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from typing import Any, Dict, List, Tuple, Union
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Form
 from app.services.storage_service import storage_service
+from app.core.config import settings
+from app.utils.file_helpers import MB, validate_files
 from app.services.ocr_service import ocr_service
-from app.api.v1.schemas.parse import ParseSuccessResponse
-from app.exceptions import FileUploadError, OcrProcessingError, PromptNotFoundError, FileValidationError
+from app.api.v1.schemas.parse import ParseSuccessResponse, BatchParseResponse, ErrorResponse
+from app.api.v1.errors import CLIENT_ERRORS, build_error_response
+from app.exceptions import FileValidationError, PromptNotFoundError
+from app.prompts.definitions import prompt_ids
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Maximum number of files from one batch processed at the same time
+BATCH_CONCURRENCY = 8
+
+# Batches whose files are all below this size are uploaded in one snowball request
+SNOWBALL_MAX_FILE_SIZE = 5 * MB
+
+def _cleanup_storage(storage_key: str) -> None:
+    """
+    Remove a transient upload from MinIO, logging if it could not be deleted.
+    """
+    logger.info(f"Cleaning up storage key: {storage_key}")
+    if not storage_service.delete_file(storage_key):
+        logger.warning(f"Failed to clean up file: {storage_key}")
+
+async def _read_validated(file: UploadFile) -> bytes:
+    """
+    Read a whole upload whose size and type were already checked (see validate_files).
+    """
+    await file.seek(0)
+    return await file.read()
+
+async def _process_upload(
+    upload_metadata: Dict[str, Any],
+    file_data: bytes,
+    prompt_id: str,
+    background_tasks: BackgroundTasks,
+) -> Dict[str, Any]:
+    """
+    Run the OCR -> cleanup pipeline for a file already uploaded to MinIO.
+    Domain exceptions are propagated to the caller.
+    """
+    storage_key = upload_metadata["storage_key"]
+    result = None
+    try:
+        # Process with OCR (uploads to Mistral internally)
+        logger.info(f"Processing document with prompt: {prompt_id}")
+        result = await asyncio.to_thread(
+            ocr_service.process_document,
+            file_data,
+            storage_key,
+            prompt_id,
+            upload_metadata["original_filename"],
+            file_size_kb=upload_metadata["file_size_kb"],
+            content_hash=upload_metadata["content_hash"],
+        )
+        return result
+    finally:
+        # Clean up MinIO storage. On success this runs after the response is
+        # sent; on failure the result is already lost, so delete inline.
+        if result is not None:
+            background_tasks.add_task(_cleanup_storage, storage_key)
+        else:
+            await asyncio.to_thread(_cleanup_storage, storage_key)
+
+async def _upload_small_batch(files: List[UploadFile], names: List[str]) -> List[Union[Tuple[Dict[str, Any], bytes], Exception]]:
+    """
+    Upload a batch of small, already validated files (with their sanitized
+    names) in a single MinIO request.
+    Returns, per file, either its (metadata, content) or the exception
+    that prevented it from being uploaded.
+    """
+    staged: List[Union[Tuple[Dict[str, Any], bytes], Exception]] = []
+    for file, name in zip(files, names):
+        try:
+            data = await _read_validated(file)
+            staged.append((storage_service.stage_upload(file, data, name), data))
+        except Exception as e:
+            staged.append(e)
+
+    objects = [(item[0]["storage_key"], item[1]) for item in staged if not isinstance(item, Exception)]
+    if objects:
+        try:
+            await asyncio.to_thread(storage_service.upload_batch, objects)
+        except Exception as e:
+            return [item if isinstance(item, Exception) else e for item in staged]
+    return staged
+
 @router.post(
     "/",
     response_model=ParseSuccessResponse,
+    responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}},
     summary="Parse a Document",
     description="Uploads a document, processes it with Mistral OCR, and returns the extracted content."
 )
 async def parse_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(..., description="The document file (PDF, PNG, JPG) to process."),
     promptId: str = Form(..., description="The ID of the prompt to use for processing.")
 ):
     """
     Handles the core document parsing workflow.
+    Errors are turned into ErrorResponse bodies by the app's exception handlers.
     """
-    storage_key = None
+    # Reject an unknown prompt before touching the file, MinIO or Mistral
+    if promptId not in prompt_ids():
+        raise PromptNotFoundError(f"Prompt '{promptId}' not found")
+
+    # Step 1: Check filename and type first, then read the document within the size cap
+    sanitized_name = await storage_service.validate_upload(file)
+    file_data = await storage_service.read_upload(file)
+
+    # Step 2: Upload to MinIO (for local storage/backup)
+    logger.info(f"Uploading file: {file.filename}")
+    upload_metadata = await storage_service.upload_file(file, file_data, sanitized_name)
+    logger.info(f"File uploaded to MinIO. Storage key: {upload_metadata['storage_key']}")
+
+    # Step 3: OCR, then clean up MinIO
+    return await _process_upload(upload_metadata, file_data, promptId, background_tasks)
+
+@router.post(
+    "/batch",
+    response_model=BatchParseResponse,
+    responses={400: {"model": ErrorResponse}},
+    summary="Parse Multiple Documents",
+    description="Processes several documents concurrently with the same prompt. Results are returned in upload order."
+)
+async def parse_batch(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(..., description="The document files (PDF, PNG, JPG) to process."),
+    promptId: str = Form(..., description="The ID of the prompt to use for processing.")
+):
+    """
+    Handles batch parsing. The whole batch is rejected if any file fails
+    size or type validation; after that, a failure on one file is reported
+    in its slot without affecting the others.
+    """
+    # Reject an unknown prompt before touching any file, MinIO or Mistral
+    if promptId not in prompt_ids():
+        raise PromptNotFoundError(f"Prompt '{promptId}' not found")
+
     try:
-        # Step 1: Upload to MinIO (for local storage/backup)
-        logger.info(f"Uploading file: {file.filename}")
-        upload_metadata = await storage_service.upload_file(file)
-        storage_key = upload_metadata["storage_key"]
-        original_filename = upload_metadata["original_filename"]
-        logger.info(f"File uploaded to MinIO. Storage key: {storage_key}")
-
-        # Step 2: Process with OCR (uploads to Mistral internally)
-        logger.info(f"Processing document with prompt: {promptId}")
-        result = ocr_service.process_document(storage_key, promptId, original_filename)
-        return result
+        validated = await asyncio.to_thread(
+            list, validate_files(((f.file, f.filename or "") for f in files), settings.MAX_UPLOAD_SIZE_MB)
+        )
+    except ValueError as e:
+        raise FileValidationError(str(e))
+    names = [name for _, name in validated]
 
-    except (FileUploadError, OcrProcessingError, PromptNotFoundError, FileValidationError) as e:
-        logger.error(f"Client error during parsing: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        logger.error(f"Internal server error during parsing: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="An unexpected internal error occurred.")
-    finally:
-        # Clean up MinIO storage
-        if storage_key:
-            logger.info(f"Cleaning up storage key: {storage_key}")
-            deleted = storage_service.delete_file(storage_key)
-            if not deleted:
-                logger.warning(f"Failed to clean up file: {storage_key}")
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    # Small files are uploaded together in one request; otherwise each file
+    # is uploaded to MinIO on its own.
+    if all(f.size is not None and f.size < SNOWBALL_MAX_FILE_SIZE for f in files):
+        staged = await _upload_small_batch(files, names)
+    else:
+        staged = [None] * len(files)
+
+    async def process_one(file: UploadFile, name: str, item) -> Dict[str, Any]:
+        if isinstance(item, Exception):
+            raise item
+        async with semaphore:
+            if item is None:
+                file_data = await _read_validated(file)
+                item = (await storage_service.upload_file(file, file_data, name), file_data)
+            return await _process_upload(*item, promptId, background_tasks)
+
+    outcomes = await asyncio.gather(
+        *(process_one(f, name, item) for f, name, item in zip(files, names, staged)),
+        return_exceptions=True
+    )
+
+    results = []
+    for file, outcome in zip(files, outcomes):
+        if not isinstance(outcome, Exception):
+            results.append(outcome)
+        else:
+            if isinstance(outcome, CLIENT_ERRORS):
+                logger.error(f"Client error during batch parsing of '{file.filename}': {outcome}")
+            else:
+                logger.error(f"Internal server error during batch parsing of '{file.filename}': {outcome}", exc_info=outcome)
+            results.append(build_error_response(outcome)[1])
+    return {"results": results}
\ No newline at end of file
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from app.prompts.definitions import load_prompts
-from app.api.v1.schemas.prompt import PromptListResponse, PromptDto
+from app.api.v1.schemas.prompt import PromptListResponse
 
 router = APIRouter()
 
@@ -15,9 +15,7 @@ def list_available_prompts():
     Handles the GET request to list all available prompts.
     """
     try:
-        prompts_data = load_prompts()
-        prompt_dtos = [PromptDto(**p) for p in prompts_data]
-        return PromptListResponse(prompts=prompt_dtos)
+        return PromptListResponse(prompts=list(load_prompts()))
     except Exception as e:
         raise HTTPException(
             status_code=500,
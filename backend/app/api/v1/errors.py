@@ -0,0 +1,27 @@
+from typing import Dict, Tuple, Type
+from app.api.v1.schemas.parse import ErrorResponse, ErrorDetail
+from app.exceptions import FileUploadError, OcrProcessingError, PromptNotFoundError, FileValidationError
+
+# Domain exceptions reported to the client as 400s, with their error codes
+CLIENT_ERROR_CODES: Dict[Type[Exception], str] = {
+    FileValidationError: "FILE_VALIDATION_ERROR",
+    FileUploadError: "FILE_UPLOAD_ERROR",
+    PromptNotFoundError: "PROMPT_NOT_FOUND",
+    OcrProcessingError: "OCR_PROCESSING_ERROR",
+}
+
+CLIENT_ERRORS = tuple(CLIENT_ERROR_CODES)
+
+# Built once: internal errors never expose exception details
+INTERNAL_ERROR_RESPONSE = ErrorResponse(
+    error=ErrorDetail(code="INTERNAL_ERROR", message="An unexpected internal error occurred.")
+)
+
+def build_error_response(exc: Exception) -> Tuple[int, ErrorResponse]:
+    """
+    Map an exception to its HTTP status code and standardized ErrorResponse.
+    """
+    for exc_type, code in CLIENT_ERROR_CODES.items():
+        if isinstance(exc, exc_type):
+            return 400, ErrorResponse(error=ErrorDetail(code=code, message=str(exc)))
+    return 500, INTERNAL_ERROR_RESPONSE
\ No newline at end of file
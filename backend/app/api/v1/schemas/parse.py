@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Union
 
 class ParseResponseData(BaseModel):
     """The 'data' part of a successful parse response."""
@@ -28,4 +28,8 @@ class ErrorDetail(BaseModel):
 class ErrorResponse(BaseModel):
     """The full response structure for a failed operation."""
     success: bool = False
-    error: ErrorDetail
\ No newline at end of file
+    error: ErrorDetail
+
+class BatchParseResponse(BaseModel):
+    """The full response structure for a batch parse, one entry per file."""
+    results: List[Union[ParseSuccessResponse, ErrorResponse]]
\ No newline at end of file
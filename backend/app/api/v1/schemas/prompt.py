@@ -1,6 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class PromptDto(BaseModel):
+    # Instances are cached and shared across requests, so keep them immutable
+    model_config = ConfigDict(frozen=True)
+
     id: str
     name: str
     description: str
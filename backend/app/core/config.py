@@ -18,6 +18,13 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = ""
     MINIO_BUCKET_NAME: str = "documents"
     
+    # --- Upload Limits ---
+    MAX_UPLOAD_SIZE_MB: int = 50
+    
+    # --- OCR Result Cache ---
+    # Number of OCR results kept in memory for identical re-uploads (0 disables)
+    OCR_CACHE_SIZE: int = 128
+    
     # --- Model Configuration ---
     model_config = SettingsConfigDict(
         env_file=str(ENV_FILE), 
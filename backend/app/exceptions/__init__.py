@@ -1,30 +1,34 @@
-from .storage_exceptions import (
-    StorageError,
-    FileUploadError,
-    FileNotFoundError,
-    FileValidationError,
-    StorageConnectionError,
-)
+import importlib
 
-from .ocr_exceptions import (
-    OcrError,
-    OcrProcessingError,
-    PromptNotFoundError,
-    OcrApiError,
-    OcrParsingError,
-)
-
-__all__ = [
+# Exceptions are loaded lazily (PEP 562) so importing one group does not
+# pull in the other submodule.
+_EXPORTS = {
     # Storage exceptions
-    "StorageError",
-    "FileUploadError",
-    "FileNotFoundError",
-    "FileValidationError",
-    "StorageConnectionError",
+    "StorageError": ".storage_exceptions",
+    "FileUploadError": ".storage_exceptions",
+    "FileNotFoundError": ".storage_exceptions",
+    "FileValidationError": ".storage_exceptions",
+    "StorageConnectionError": ".storage_exceptions",
     # OCR exceptions
-    "OcrError",
-    "OcrProcessingError",
-    "PromptNotFoundError",
-    "OcrApiError",
-    "OcrParsingError",
-]
+    "OcrError": ".ocr_exceptions",
+    "OcrProcessingError": ".ocr_exceptions",
+    "PromptNotFoundError": ".ocr_exceptions",
+    "OcrApiError": ".ocr_exceptions",
+    "OcrParsingError": ".ocr_exceptions",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    try:
+        module_name = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,6 +1,14 @@
-from fastapi import FastAPI
+import logging
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.v1.api import api_router
+from app.api.v1.errors import CLIENT_ERRORS, INTERNAL_ERROR_RESPONSE, build_error_response
+
+logger = logging.getLogger(__name__)
+
+# Serialized once; returned for every unexpected error
+INTERNAL_ERROR_CONTENT = INTERNAL_ERROR_RESPONSE.model_dump()
 
 app = FastAPI(
     title="DotOCR API",
@@ -9,6 +17,20 @@ app = FastAPI(
 )
 
 # --- Middleware Configuration ---
+# Registered before CORSMiddleware so it sits inside it: the generic 500 body
+# must still carry CORS headers. An Exception handler on the app would run in
+# ServerErrorMiddleware, outside CORS.
+@app.middleware("http")
+async def internal_error_middleware(request: Request, call_next):
+    """
+    Log unexpected errors and return a generic ErrorResponse.
+    """
+    try:
+        return await call_next(request)
+    except Exception as exc:
+        logger.error(f"Internal server error during {request.url.path}: {exc}", exc_info=exc)
+        return JSONResponse(status_code=500, content=INTERNAL_ERROR_CONTENT)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
@@ -18,6 +40,20 @@ app.add_middleware(
 )
 
 
+# --- Exception Handlers ---
+async def client_error_handler(request: Request, exc: Exception) -> JSONResponse:
+    """
+    Return domain errors in the documented ErrorResponse shape.
+    """
+    logger.error(f"Client error during {request.url.path}: {exc}")
+    status_code, error_response = build_error_response(exc)
+    return JSONResponse(status_code=status_code, content=error_response.model_dump())
+
+
+for exc_type in CLIENT_ERRORS:
+    app.add_exception_handler(exc_type, client_error_handler)
+
+
 # --- API Router Inclusion ---
 app.include_router(api_router, prefix="/api/v1")
 
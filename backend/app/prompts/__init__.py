@@ -1,3 +1,3 @@
-from .definitions import load_prompts
+from .definitions import load_prompts, prompt_ids
 
-__all__ = ["load_prompts"]
\ No newline at end of file
+__all__ = ["load_prompts", "prompt_ids"]
\ No newline at end of file
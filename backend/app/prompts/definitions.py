@@ -1,17 +1,27 @@
-import json
+import orjson
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import FrozenSet, Tuple
+from app.api.v1.schemas.prompt import PromptDto
 
-def load_prompts() -> List[Dict[str, Any]]:
+@lru_cache(maxsize=1)
+def load_prompts() -> Tuple[PromptDto, ...]:
     """
     Load available prompts from definitions.json.
-    Returns: List of prompt dicts (id, name, description).
+    The file is parsed once and cached for the life of the process.
+    Returns: Immutable tuple of PromptDto (id, name, description).
     """
     file_path = Path(__file__).parent / "definitions.json"
     if not file_path.exists():
         raise FileNotFoundError("Prompt definitions file not found")
     
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = orjson.loads(file_path.read_bytes())
     
-    return data
\ No newline at end of file
+    return tuple(PromptDto(**p) for p in data)
+
+@lru_cache(maxsize=1)
+def prompt_ids() -> FrozenSet[str]:
+    """
+    Return the set of known prompt IDs for O(1) membership checks.
+    """
+    return frozenset(p.id for p in load_prompts())
\ No newline at end of file
@@ -1,16 +1,23 @@
-import uuid
+import secrets
 import re
+import threading
 import time
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
 import logging
 from mistralai import Mistral, SDKError
 from app.core.config import settings
-from app.services.storage_service import storage_service
-from app.prompts.definitions import load_prompts
+from app.prompts.definitions import prompt_ids
 from app.exceptions import OcrProcessingError, PromptNotFoundError
 
 logger = logging.getLogger(__name__)
 
+# Patterns used by _clean_markdown, compiled once at import.
+# A symbol swallows the whitespace after it, so a whole run of symbols and
+# whitespace (e.g. "## ", "- - -") is removed in a single match.
+_MD_SYMBOLS = re.compile(r'[#*`\-][#*`\-\s]*')
+_BLANK_LINES = re.compile(r'\n\s*\n')
+
 class OcrService:
     """OCR service using Mistral API with direct file upload."""
     
@@ -19,32 +26,86 @@ class OcrService:
             raise ValueError("MISTRAL_API_KEY is required")
         self.client = Mistral(api_key=settings.MISTRAL_API_KEY)
         self.model = "mistral-ocr-latest"
+        # In-memory LRU of OCR results keyed by (content hash, prompt id)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[str, str]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
         logger.info("OcrService initialized")
     
-    def process_document(self, storage_key: str, prompt_id: str, original_filename: str) -> Dict[str, Any]:
+    def process_document(
+        self,
+        file_data: bytes,
+        storage_key: str,
+        prompt_id: str,
+        original_filename: str,
+        file_size_kb: Optional[float] = None,
+        content_hash: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         Process document by uploading directly to Mistral.
         
         Args:
+            file_data: Raw document bytes
             storage_key: Key in MinIO storage
             prompt_id: ID of the prompt to use
             original_filename: Original filename (needed for Mistral upload)
+            file_size_kb: Size reported by the storage upload, if already known
+            content_hash: Digest of file_data; when given, results are cached
+                per (content_hash, prompt_id) and repeat requests skip Mistral
         """
         start_time = time.time()
-        request_id = f"ocr_{uuid.uuid4().hex[:8]}"
-        uploaded_file_id = None
+        request_id = f"ocr_{secrets.token_hex(4)}"
+        
+        # Step 1: Validate prompt (outside the try so it is not re-wrapped)
+        if prompt_id not in prompt_ids():
+            raise PromptNotFoundError(f"Prompt '{prompt_id}' not found")
         
         try:
-            # Step 1: Validate prompt
-            prompts = load_prompts()
-            if not any(p["id"] == prompt_id for p in prompts):
-                raise PromptNotFoundError(f"Prompt '{prompt_id}' not found")
+            # Step 2: Reuse the result of an identical earlier request
+            cache_key = (content_hash, prompt_id) if content_hash else None
+            cached = self._cache_get(cache_key) if cache_key else None
+            if cached is not None:
+                logger.info(f"OCR cache hit for content hash: {content_hash}")
+                markdown, raw_text = cached
+            else:
+                # Step 3: Run OCR on Mistral
+                ocr_content = self._run_ocr(file_data, original_filename)
+                markdown = ocr_content.strip()
+                raw_text = self._clean_markdown(ocr_content)
+                if cache_key:
+                    self._cache_put(cache_key, (markdown, raw_text))
             
-            # Step 2: Get file data from MinIO
-            logger.info(f"Retrieving file from storage: {storage_key}")
-            file_data = storage_service.get_file_data(storage_key)
+            processing_time = time.time() - start_time
+            
+            return {
+                "success": True,
+                "data": {
+                    "markdown": markdown,
+                    "rawText": raw_text
+                },
+                "metadata": {
+                    "storage_key": storage_key,
+                    "model": self.model,
+                    "processing_time_ms": int(processing_time * 1000),
+                    "request_id": request_id,
+                    "file_size_kb": file_size_kb if file_size_kb is not None else len(file_data) / 1024
+                }
+            }
             
-            # Step 3: Upload file directly to Mistral
+        except SDKError as e:
+            logger.error(f"Mistral API error: {e}")
+            raise OcrProcessingError(f"OCR API failed: {str(e)}")
+        except Exception as e:
+            logger.error(f"OCR processing failed: {e}")
+            raise OcrProcessingError(f"Processing failed: {str(e)}")
+    
+    def _run_ocr(self, file_data: bytes, original_filename: str) -> str:
+        """
+        Upload a document to Mistral, run OCR on it and return the markdown.
+        The uploaded Mistral file is always deleted afterwards.
+        """
+        uploaded_file_id = None
+        try:
+            # Upload file directly to Mistral
             logger.info(f"Uploading file to Mistral: {original_filename}")
             uploaded_file = self.client.files.upload(
                 file={
@@ -56,12 +117,12 @@ class OcrService:
             uploaded_file_id = uploaded_file.id
             logger.info(f"File uploaded to Mistral with ID: {uploaded_file_id}")
             
-            # Step 4: Get signed URL from Mistral
+            # Get signed URL from Mistral
             signed_url_response = self.client.files.get_signed_url(file_id=uploaded_file_id)
             signed_url = signed_url_response.url
             logger.info(f"Got signed URL from Mistral")
             
-            # Step 5: Process with OCR
+            # Process with OCR
             response = self.client.ocr.process(
                 model=self.model,
                 document={
@@ -71,41 +132,13 @@ class OcrService:
                 include_image_base64=False
             )
             
-            # Step 6: Extract content
+            # Extract content
             if hasattr(response, 'pages') and response.pages:
-                pages_content = [page.markdown for page in response.pages]
-                ocr_content = "\n\n---\n\n".join(pages_content) if len(pages_content) > 1 else pages_content[0]
+                return "\n\n---\n\n".join(page.markdown for page in response.pages)
             elif hasattr(response, 'content'):
-                ocr_content = response.content
+                return response.content
             else:
-                ocr_content = "No content extracted"
-            
-            # Process content
-            markdown = ocr_content.strip()
-            raw_text = self._clean_markdown(ocr_content)
-            processing_time = time.time() - start_time
-            
-            return {
-                "success": True,
-                "data": {
-                    "markdown": markdown,
-                    "rawText": raw_text
-                },
-                "metadata": {
-                    "storage_key": storage_key,
-                    "model": self.model,
-                    "processing_time_ms": int(processing_time * 1000),
-                    "request_id": request_id,
-                    "file_size_kb": len(file_data) / 1024
-                }
-            }
-            
-        except SDKError as e:
-            logger.error(f"Mistral API error: {e}")
-            raise OcrProcessingError(f"OCR API failed: {str(e)}")
-        except Exception as e:
-            logger.error(f"OCR processing failed: {e}")
-            raise OcrProcessingError(f"Processing failed: {str(e)}")
+                return "No content extracted"
         finally:
             if uploaded_file_id:
                 try:
@@ -114,12 +147,28 @@ class OcrService:
                 except Exception as e:
                     logger.warning(f"Failed to delete Mistral file {uploaded_file_id}: {e}")
     
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[Tuple[str, str]]:
+        """Return the cached (markdown, rawText) for key, marking it recently used."""
+        with self._cache_lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+            return value
+    
+    def _cache_put(self, key: Tuple[str, str], value: Tuple[str, str]) -> None:
+        """Store a result, evicting the least recently used entry when full."""
+        if settings.OCR_CACHE_SIZE <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > settings.OCR_CACHE_SIZE:
+                self._cache.popitem(last=False)
+    
     @staticmethod
     def _clean_markdown(content: str) -> str:
         """Remove markdown syntax for plain text output."""
-        cleaned = re.sub(r'[#*`-]\s*', '', content)
-        cleaned = re.sub(r'\n\s*\n', '\n', cleaned)
-        return cleaned.strip()
+        return _BLANK_LINES.sub('\n', _MD_SYMBOLS.sub('', content)).strip()
 
 # Singleton
 ocr_service = OcrService()
@@ -1,13 +1,19 @@
 from __future__ import annotations
+import asyncio
+import io
 import logging
+import secrets
+import time
 import typing
-import uuid
+import urllib3
 from datetime import datetime, timezone
+from blake3 import blake3
 from minio import Minio
+from minio.commonconfig import SnowballObject
 from minio.error import S3Error
 from fastapi import UploadFile
 from app.core.config import settings
-from app.utils.file_helpers import get_file_size_kb, validate_file_type, sanitize_filename
+from app.utils.file_helpers import MB, parse_upload, read_capped, validate_file_type_async
 from app.exceptions import (
     FileUploadError,
     FileNotFoundError,
@@ -18,6 +24,17 @@ from app.exceptions import (
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
+# Content above this size is hashed with BLAKE3's multithreaded mode
+HASH_MULTITHREAD_THRESHOLD = 1 * MB
+
+def _new_hasher(size: typing.Optional[int]) -> blake3:
+    """
+    Return a BLAKE3 hasher, multithreaded for content known to be large.
+    """
+    if size is not None and size > HASH_MULTITHREAD_THRESHOLD:
+        return blake3(max_threads=blake3.AUTO)
+    return blake3()
+
 class StorageService:
     """
     Service for handling file operations with MinIO object storage.
@@ -26,122 +43,207 @@ class StorageService:
     def __init__(self):
         logger.info("Initializing StorageService")
         try:
+            # Shared keep-alive pool so repeated calls reuse sockets
+            http_client = urllib3.PoolManager(
+                num_pools=10,
+                maxsize=64,
+                block=False,
+                retries=urllib3.Retry(total=3, backoff_factor=0.1),
+                timeout=urllib3.Timeout(connect=3, read=30)
+            )
             self.client = Minio(
                 settings.MINIO_ENDPOINT,
                 access_key=settings.MINIO_ACCESS_KEY,
                 secret_key=settings.MINIO_SECRET_KEY,
-                secure=False  # Set to True for HTTPS
+                secure=False,  # Set to True for HTTPS
+                http_client=http_client
             )
             self.bucket_name = settings.MINIO_BUCKET_NAME
-            logger.info(f"MinIO client configured for endpoint: {settings.MINIO_ENDPOINT}, bucket: {self.bucket_name}")
+            logger.info("MinIO client configured for endpoint: %s, bucket: %s", settings.MINIO_ENDPOINT, self.bucket_name)
             self._ensure_bucket_exists()
             logger.info("StorageService initialization completed successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize StorageService: {e}", exc_info=True)
+            logger.error("Failed to initialize StorageService: %s", e, exc_info=True)
             raise StorageConnectionError(f"Failed to initialize storage service: {str(e)}")
     
     def _ensure_bucket_exists(self) -> None:
         """
         Create the bucket if it doesn't exist.
         """
-        logger.debug(f"Checking if bucket '{self.bucket_name}' exists")
+        logger.debug("Checking if bucket '%s' exists", self.bucket_name)
         try:
             if not self.client.bucket_exists(self.bucket_name):
-                logger.info(f"Bucket '{self.bucket_name}' does not exist, creating it")
+                logger.info("Bucket '%s' does not exist, creating it", self.bucket_name)
                 self.client.make_bucket(self.bucket_name)
-                logger.info(f"Successfully created bucket: {self.bucket_name}")
+                logger.info("Successfully created bucket: %s", self.bucket_name)
             else:
-                logger.debug(f"Bucket '{self.bucket_name}' already exists")
+                logger.debug("Bucket '%s' already exists", self.bucket_name)
         except S3Error as e:
-            logger.error(f"S3Error while checking/creating bucket '{self.bucket_name}': {e}", exc_info=True)
+            logger.error("S3Error while checking/creating bucket '%s': %s", self.bucket_name, e, exc_info=True)
             raise StorageConnectionError(f"S3 error while managing bucket: {str(e)}")
         except Exception as e:
-            logger.error(f"Unexpected error while ensuring bucket exists: {e}", exc_info=True)
+            logger.error("Unexpected error while ensuring bucket exists: %s", e, exc_info=True)
             raise StorageConnectionError(f"Unexpected error managing bucket: {str(e)}")
     
-    async def upload_file(self, file: UploadFile) -> dict:
+    async def validate_upload(self, file: UploadFile) -> str:
+        """
+        Validate an upload's filename and type (extension and magic bytes)
+        without reading the rest of the file.
+        
+        Returns:
+            str: The sanitized filename, for stage_upload/upload_file
+        
+        Raises:
+            FileValidationError: If no filename was provided or the type is not supported
+        """
+        logger.debug("Validating file type for: %s", file.filename)
+        if not file.filename:
+            raise FileValidationError("Filename is required but was not provided")
+        suffix, sanitized_name = parse_upload(file.filename)
+        try:
+            await validate_file_type_async(file.file, file.filename, suffix)
+        except ValueError as e:
+            logger.warning("File validation failed for '%s': %s", file.filename, e)
+            raise FileValidationError(str(e))
+        logger.debug("File type validation passed")
+        return sanitized_name
+    
+    def _generate_key(self, sanitized_name: str, now: datetime) -> str:
         """
-        Upload a file to MinIO and return metadata.
+        Derive a unique storage key for an upload from the given upload time.
+        """
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        unique_id = secrets.token_hex(4)
+        storage_key = f"{timestamp}_{unique_id}_{sanitized_name}"
+        logger.debug("Generated storage key: %s", storage_key)
+        return storage_key
+    
+    async def read_upload(self, file: UploadFile) -> bytes:
+        """
+        Read a whole upload into memory, enforcing the configured size cap.
         
         Args:
             file: FastAPI UploadFile object
             
         Returns:
-            dict: File metadata including storage_key, original_filename, etc.
+            bytes: File content
             
         Raises:
-            ValueError: If file type is not supported
-            Exception: If upload fails
+            FileValidationError: If the file exceeds MAX_UPLOAD_SIZE_MB
         """
-        upload_start_time = datetime.now(timezone.utc)
-        logger.info(f"Starting file upload for: {file.filename}")
-        
+        await file.seek(0)
         try:
-            # Reset file pointer to beginning
-            await file.seek(0)
-            logger.debug("File pointer reset to beginning")
-            
-            # Validate file type
-            logger.debug(f"Validating file type for: {file.filename}")
-            if not file.filename:
-                raise FileValidationError("Filename is required but was not provided")
-            validate_file_type(file.file, file.filename)
-            logger.debug("File type validation passed")
+            return await asyncio.to_thread(read_capped, file.file, settings.MAX_UPLOAD_SIZE_MB)
+        except ValueError as e:
+            logger.warning("File validation failed for '%s': %s", file.filename, e)
+            raise FileValidationError(str(e))
+    
+    def stage_upload(self, file: UploadFile, data: bytes, sanitized_name: str) -> dict:
+        """
+        Build the storage metadata for a file's content, already read into
+        memory, without uploading it (see upload_file and upload_batch).
+        
+        Args:
+            file: FastAPI UploadFile object
+            data: File content
+            sanitized_name: Filename as returned by validation, used in the storage key
             
-            # Generate unique storage key
-            timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())[:8]
-            # file.filename is guaranteed to be not None by validation above
-            sanitized_name = sanitize_filename(file.filename)
-            storage_key = f"{timestamp}_{unique_id}_{sanitized_name}"
-            logger.debug(f"Generated storage key: {storage_key}")
+        Returns:
+            dict: File metadata including storage_key, original_filename, etc.
+        """
+        upload_timestamp = datetime.now(timezone.utc)
+        storage_key = self._generate_key(sanitized_name, upload_timestamp)
+        
+        hasher = _new_hasher(len(data))
+        hasher.update(data)
+        
+        return {
+            "storage_key": storage_key,
+            "original_filename": file.filename,
+            "file_size_kb": round(len(data) / 1024, 2),
+            "content_type": file.content_type,
+            "content_hash": hasher.hexdigest(),
+            "upload_timestamp": upload_timestamp.isoformat()
+        }
+    
+    async def upload_file(self, file: UploadFile, data: bytes, sanitized_name: str) -> dict:
+        """
+        Upload a file's content, already read into memory, to MinIO and return metadata.
+        
+        Args:
+            file: FastAPI UploadFile object
+            data: File content
+            sanitized_name: Filename as returned by validation, used in the storage key
             
-            # Get file size
-            file_size_kb = get_file_size_kb(file.file)
-            logger.debug(f"File size: {file_size_kb} KB")
+        Returns:
+            dict: File metadata including storage_key, original_filename, etc.
             
-            # Reset file pointer again before upload
-            await file.seek(0)
+        Raises:
+            FileUploadError: If upload fails
+        """
+        upload_start_time = time.monotonic()
+        logger.info("Starting file upload for: %s", file.filename)
+        
+        try:
+            metadata = self.stage_upload(file, data, sanitized_name)
+            storage_key = metadata["storage_key"]
             
-            # Upload to MinIO
-            logger.info(f"Uploading file to MinIO with key: {storage_key}")
+            logger.info("Uploading file to MinIO with key: %s", storage_key)
             # Use application/octet-stream as fallback if content_type is None
             content_type = file.content_type or "application/octet-stream"
-            self.client.put_object(
+            # put_object blocks on network I/O; keep it off the event loop
+            await asyncio.to_thread(
+                self.client.put_object,
                 bucket_name=self.bucket_name,
                 object_name=storage_key,
-                data=file.file,
-                length=int(file_size_kb * 1024),  # Convert back to bytes
+                data=io.BytesIO(data),
+                length=len(data),
                 content_type=content_type
             )
             
-            upload_duration = (datetime.now(timezone.utc) - upload_start_time).total_seconds()
-            
-            # Return metadata
-            metadata = {
-                "storage_key": storage_key,
-                "original_filename": file.filename,
-                "file_size_kb": round(file_size_kb, 2),
-                "content_type": file.content_type,
-                "upload_timestamp": datetime.now(timezone.utc).isoformat()
-            }
-            
-            logger.info(f"File upload completed successfully in {upload_duration:.2f}s. "
-                       f"Storage key: {storage_key}, Size: {file_size_kb:.2f} KB")
+            upload_duration = time.monotonic() - upload_start_time
+            logger.info("File upload completed successfully in %.2fs. "
+                        "Storage key: %s, Size: %.2f KB", upload_duration, storage_key, metadata["file_size_kb"])
             
             return metadata
             
-        except ValueError as e:
-            logger.warning(f"File validation failed for '{file.filename}': {e}")
-            # Re-raise as FileValidationError
-            raise FileValidationError(str(e))
         except S3Error as e:
-            logger.error(f"S3Error during file upload for '{file.filename}': {e}", exc_info=True)
+            logger.error("S3Error during file upload for '%s': %s", file.filename, e, exc_info=True)
             raise FileUploadError(f"Failed to upload file: {str(e)}")
         except Exception as e:
-            logger.error(f"Unexpected error during upload of '{file.filename}': {e}", exc_info=True)
+            logger.error("Unexpected error during upload of '%s': %s", file.filename, e, exc_info=True)
             raise FileUploadError(f"Unexpected error during file upload: {str(e)}")
     
+    def upload_batch(self, files: typing.List[typing.Tuple[str, bytes]]) -> typing.List[str]:
+        """
+        Upload many small objects in a single request using MinIO snowball
+        (objects are packed into one tar stream and extracted server-side).
+        
+        Args:
+            files: (storage_key, content) pairs
+            
+        Returns:
+            list: The storage keys that were uploaded
+        """
+        logger.info("Uploading batch of %s files to MinIO", len(files))
+        
+        try:
+            self.client.upload_snowball_objects(
+                self.bucket_name,
+                [
+                    SnowballObject(storage_key, data=io.BytesIO(content), length=len(content))
+                    for storage_key, content in files
+                ]
+            )
+            logger.info("Batch upload completed successfully: %s files", len(files))
+            return [storage_key for storage_key, _ in files]
+        except S3Error as e:
+            logger.error("S3Error during batch upload: %s", e, exc_info=True)
+            raise FileUploadError(f"Failed to upload files: {str(e)}")
+        except Exception as e:
+            logger.error("Unexpected error during batch upload: %s", e, exc_info=True)
+            raise FileUploadError(f"Unexpected error during batch upload: {str(e)}")
+    
     def get_file_url(self, storage_key: str, expires_in_hours: int = 1) -> str:
         """
         Generate a presigned URL to access the file.
@@ -153,7 +255,7 @@ class StorageService:
         Returns:
             str: Presigned URL for file access
         """
-        logger.info(f"Generating presigned URL for file: {storage_key}, expires in {expires_in_hours} hours")
+        logger.info("Generating presigned URL for file: %s, expires in %s hours", storage_key, expires_in_hours)
         
         try:
             from datetime import timedelta
@@ -164,15 +266,15 @@ class StorageService:
                 expires=timedelta(hours=expires_in_hours)
             )
             
-            logger.info(f"Presigned URL generated successfully for: {storage_key}")
-            logger.debug(f"Generated URL (first 50 chars): {url[:50]}...")
+            logger.info("Presigned URL generated successfully for: %s", storage_key)
+            logger.debug("Generated URL (first 50 chars): %.50s...", url)
             
             return url
         except S3Error as e:
-            logger.error(f"S3Error generating presigned URL for '{storage_key}': {e}", exc_info=True)
+            logger.error("S3Error generating presigned URL for '%s': %s", storage_key, e, exc_info=True)
             raise FileNotFoundError(f"Failed to generate file URL: {str(e)}")
         except Exception as e:
-            logger.error(f"Unexpected error generating presigned URL for '{storage_key}': {e}", exc_info=True)
+            logger.error("Unexpected error generating presigned URL for '%s': %s", storage_key, e, exc_info=True)
             raise StorageConnectionError(f"Failed to generate file URL: {str(e)}")
     
     def get_file_data(self, storage_key: str) -> bytes:
@@ -185,26 +287,29 @@ class StorageService:
         Returns:
             bytes: File content as bytes
         """
-        logger.info(f"Retrieving file data for: {storage_key}")
+        logger.info("Retrieving file data for: %s", storage_key)
         
         try:
             response = self.client.get_object(
                 bucket_name=self.bucket_name,
                 object_name=storage_key
             )
-            data = response.read()
-            response.close()
-            response.release_conn()
+            try:
+                data = response.read()
+            finally:
+                # Always hand the connection back to the pool
+                response.close()
+                response.release_conn()
             
             data_size_kb = len(data) / 1024
-            logger.info(f"File data retrieved successfully for '{storage_key}': {data_size_kb:.2f} KB")
+            logger.info("File data retrieved successfully for '%s': %.2f KB", storage_key, data_size_kb)
             
             return data
         except S3Error as e:
-            logger.error(f"S3Error retrieving file data for '{storage_key}': {e}", exc_info=True)
+            logger.error("S3Error retrieving file data for '%s': %s", storage_key, e, exc_info=True)
             raise FileNotFoundError(f"Failed to retrieve file: {str(e)}")
         except Exception as e:
-            logger.error(f"Unexpected error retrieving file data for '{storage_key}': {e}", exc_info=True)
+            logger.error("Unexpected error retrieving file data for '%s': %s", storage_key, e, exc_info=True)
             raise StorageConnectionError(f"Failed to retrieve file: {str(e)}")
     
     def delete_file(self, storage_key: str) -> bool:
@@ -217,20 +322,20 @@ class StorageService:
         Returns:
             bool: True if deletion was successful
         """
-        logger.info(f"Attempting to delete file: {storage_key}")
+        logger.info("Attempting to delete file: %s", storage_key)
         
         try:
             self.client.remove_object(
                 bucket_name=self.bucket_name,
                 object_name=storage_key
             )
-            logger.info(f"File deleted successfully: {storage_key}")
+            logger.info("File deleted successfully: %s", storage_key)
             return True
         except S3Error as e:
-            logger.error(f"S3Error deleting file '{storage_key}': {e}", exc_info=True)
+            logger.error("S3Error deleting file '%s': %s", storage_key, e, exc_info=True)
             return False
         except Exception as e:
-            logger.error(f"Unexpected error deleting file '{storage_key}': {e}", exc_info=True)
+            logger.error("Unexpected error deleting file '%s': %s", storage_key, e, exc_info=True)
             return False
     
     def file_exists(self, storage_key: str) -> bool:
@@ -243,23 +348,23 @@ class StorageService:
         Returns:
             bool: True if file exists
         """
-        logger.debug(f"Checking if file exists: {storage_key}")
+        logger.debug("Checking if file exists: %s", storage_key)
         
         try:
             self.client.stat_object(
                 bucket_name=self.bucket_name,
                 object_name=storage_key
             )
-            logger.debug(f"File '{storage_key}' exists in MinIO")
+            logger.debug("File '%s' exists in MinIO", storage_key)
             return True
         except S3Error as e:
             if e.code == 'NoSuchKey':
-                logger.debug(f"File '{storage_key}' does not exist in MinIO")
+                logger.debug("File '%s' does not exist in MinIO", storage_key)
             else:
-                logger.warning(f"S3Error checking file existence for '{storage_key}': {e}")
+                logger.warning("S3Error checking file existence for '%s': %s", storage_key, e)
             return False
         except Exception as e:
-            logger.error(f"Unexpected error checking file existence for '{storage_key}': {e}", exc_info=True)
+            logger.error("Unexpected error checking file existence for '%s': %s", storage_key, e, exc_info=True)
             return False
 
 # Create a singleton instance
@@ -1,7 +1,19 @@
 from .file_helpers import (
     get_file_size_kb,
+    read_capped,
+    parse_upload,
     validate_file_type,
+    validate_file_type_async,
+    validate_files,
     sanitize_filename,
 )
 
-__all__ = ["get_file_size_kb", "validate_file_type", "sanitize_filename"]
\ No newline at end of file
+__all__ = [
+    "get_file_size_kb",
+    "read_capped",
+    "parse_upload",
+    "validate_file_type",
+    "validate_file_type_async",
+    "validate_files",
+    "sanitize_filename",
+]
\ No newline at end of file
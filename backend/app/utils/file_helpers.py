@@ -1,35 +1,162 @@
 from __future__ import annotations
+import asyncio
+import io
+import os
+import re
+import string
 import typing
-from pathlib import Path
+from functools import lru_cache
 
 MB = 1_048_576
-ALLOWED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".tiff", ".bmp"}
+# Common extensions are checked first with a short tuple scan; rare ones fall through
+_HOT_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg")
+_COLD_EXTENSIONS = frozenset({".tiff", ".bmp"})
+ALLOWED_EXTENSIONS = frozenset(_HOT_EXTENSIONS) | _COLD_EXTENSIONS
+_ALLOWED_STR = ", ".join(sorted(ALLOWED_EXTENSIONS))
 
-def get_file_size_kb(file: typing.BinaryIO) -> float:
+# Leading magic bytes and the extensions they are valid for, most common first
+_MAGICS: tuple[tuple[bytes, frozenset[str]], ...] = (
+    (b"%PDF-", frozenset({".pdf"})),
+    (b"\x89PNG\r\n\x1a\n", frozenset({".png"})),
+    (b"\xff\xd8\xff", frozenset({".jpg", ".jpeg"})),
+    (b"II*\x00", frozenset({".tiff"})),
+    (b"MM\x00*", frozenset({".tiff"})),
+    (b"BM", frozenset({".bmp"})),
+)
+_SNIFF_BYTES = 12
+
+# Anything other than word characters (Unicode alphanumerics and underscore),
+# dot, dash and space
+_SANITIZE_RE = re.compile(r'[^\w.\- ]+')
+
+# Same policy restricted to ASCII, as a bytes deletion table for the fast path
+_ASCII_ALLOWED = frozenset((string.ascii_letters + string.digits + "._- ").encode("ascii"))
+_ASCII_DELETE = bytes(b for b in range(128) if b not in _ASCII_ALLOWED)
+
+def _get_file_size_bytes(file: typing.BinaryIO) -> int:
     """
-    Return file size in kilobytes (float).
-    Moves the cursor back to 0 after measuring.
+    Return file size in bytes.
+    An in-memory SpooledTemporaryFile (Starlette's upload buffer) is sized
+    from its buffer with no syscall; real files use fstat on the underlying
+    descriptor; anything else is measured with seek/tell.
+    The cursor position is left unchanged.
     """
-    file.seek(0, 2)          
+    if getattr(file, "_rolled", None) is False:
+        # Not rolled over yet; calling fileno() here would force it to disk
+        with file._file.getbuffer() as buffer:
+            return buffer.nbytes
+    try:
+        file.flush()  # make pending buffered writes visible to fstat
+        return os.fstat(file.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+    pos = file.tell()
+    file.seek(0, os.SEEK_END)
     size_bytes = file.tell()
-    file.seek(0)            
-    return size_bytes / 1024
+    file.seek(pos)
+    return size_bytes
+
+def get_file_size_kb(file: typing.BinaryIO) -> float:
+    """
+    Return file size in kilobytes (float), e.g. for display.
+    The cursor position is left unchanged.
+    """
+    return _get_file_size_bytes(file) / 1024
+
+def read_capped(file: typing.BinaryIO, max_mb: int) -> bytes:
+    """
+    Read the rest of the file, raising ValueError if it exceeds max_mb.
+    Reads at most one byte past the cap, so no separate size check is needed.
+    """
+    limit = max_mb * MB
+    data = file.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f"File too large. Maximum size: {max_mb} MB")
+    return data
+
+@lru_cache(maxsize=1024)
+def _file_suffix(filename: str) -> str:
+    """
+    Return the lowercased extension of filename.
+    Cached, as retrying clients re-send the same names.
+    """
+    return os.path.splitext(filename)[1].lower()
 
-def validate_file_type(file: typing.BinaryIO, filename: str) -> None:
+def _check_extension(suffix: str) -> None:
     """
-    Raise ValueError if extension is not whitelisted.
+    Raise ValueError if the lowercased extension is not whitelisted.
+    """
+    if suffix not in _HOT_EXTENSIONS and suffix not in _COLD_EXTENSIONS:
+        raise ValueError(f"Unsupported extension {suffix!r}. Allowed: {_ALLOWED_STR}")
+
+def parse_upload(name: str) -> tuple[str, str]:
+    """
+    Derive everything the upload path needs from a filename in one call.
+    Returns (lowercased extension, sanitized name).
+    """
+    return _file_suffix(name), sanitize_filename(name)
+
+def validate_file_type(
+    file: typing.BinaryIO, filename: str, suffix: typing.Optional[str] = None
+) -> None:
+    """
+    Raise ValueError if extension is not whitelisted, or if the file's
+    leading magic bytes do not match the extension.
     We do NOT trust the mime-type from the client.
+    Pass suffix (e.g. from parse_upload) to skip re-deriving it.
+    Leaves the cursor at the start of the file.
+    """
+    if suffix is None:
+        suffix = _file_suffix(filename)
+    _check_extension(suffix)
+
+    file.seek(0)
+    head = file.read(_SNIFF_BYTES)
+    file.seek(0)
+    for signature, extensions in _MAGICS:
+        if head.startswith(signature):
+            if suffix in extensions:
+                return
+            break
+    raise ValueError(f"File content does not match extension {suffix!r}")
+
+def validate_files(
+    items: typing.Iterable[tuple[typing.BinaryIO, str]], max_mb: int
+) -> typing.Iterator[tuple[typing.BinaryIO, str]]:
+    """
+    Lazily validate (file, filename) pairs for size and type, yielding each
+    file with its sanitized name as soon as it passes.
+    Raise ValueError, naming the file, on the first failure.
+    """
+    max_bytes = max_mb * MB
+    for file, filename in items:
+        if _get_file_size_bytes(file) > max_bytes:
+            raise ValueError(f"{filename}: File too large. Maximum size: {max_mb} MB")
+        suffix, sanitized_name = parse_upload(filename)
+        try:
+            validate_file_type(file, filename, suffix)
+        except ValueError as e:
+            raise ValueError(f"{filename}: {e}") from None
+        yield file, sanitized_name
+
+async def validate_file_type_async(
+    file: typing.BinaryIO, filename: str, suffix: typing.Optional[str] = None
+) -> None:
+    """
+    Async validate_file_type. The magic-byte read runs in a worker thread
+    once a SpooledTemporaryFile has rolled to disk; an in-memory upload is
+    checked inline, as the thread hop would cost more than the read.
     """
-    suffix = Path(filename.lower()).suffix
-    if suffix not in ALLOWED_EXTENSIONS:
-        raise ValueError(
-            f"Unsupported extension {suffix!r}. "
-            f"Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
-        )
+    if getattr(file, "_rolled", None) is False:
+        validate_file_type(file, filename, suffix)
+    else:
+        await asyncio.to_thread(validate_file_type, file, filename, suffix)
 
 def sanitize_filename(name: str) -> str:
     """
     Return a filesystem-safe string.
     Keeps alphanumerics, dash, underscore, dot.
     """
-    return "".join(c for c in name if c.isalnum() or c in "._- ").strip()
\ No newline at end of file
+    if name.isascii():
+        return name.encode("ascii").translate(None, _ASCII_DELETE).decode("ascii").strip()
+    return _SANITIZE_RE.sub('', name).strip()
\ No newline at end of file